@@ -1,13 +1,17 @@
-
 import pytest
+import pytest_asyncio
 import asyncio
-from unittest.mock import AsyncMock, patch
+from httpx import AsyncClient
+from unittest.mock import AsyncMock, MagicMock, patch
 import sys
 import os
 
 # Add the project root to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from main import app
+from mock_data import MOCK_BANKS, MOCK_BRANCHES
+
 @pytest.fixture(scope="session")
 def event_loop():
     """Create an instance of the default event loop for the test session."""
@@ -15,67 +19,44 @@ def event_loop():
     yield loop
     loop.close()
 
-# Mock database for testing
-@pytest.fixture(autouse=True)
+@pytest_asyncio.fixture(scope="function")
 async def mock_database():
-    """Mock database responses for testing"""
-    
-    mock_banks = [
-        {"id": 1, "name": "State Bank of India"},
-        {"id": 2, "name": "HDFC Bank"},
-        {"id": 3, "name": "ICICI Bank"}
-    ]
-    
-    mock_branches = [
-        {
-            "ifsc": "SBIN0000001",
-            "bank_id": 1,
-            "branch": "Mumbai Main Branch",
-            "address": "123 Fort Area, Mumbai",
-            "city": "Mumbai",
-            "district": "Mumbai",
-            "state": "Maharashtra",
-            "bank_name": "State Bank of India",
-            "bank_id_ref": 1
-        },
-        {
-            "ifsc": "HDFC0000001", 
-            "bank_id": 2,
-            "branch": "Delhi Branch",
-            "address": "456 CP, New Delhi",
-            "city": "Delhi",
-            "district": "Central Delhi", 
-            "state": "Delhi",
-            "bank_name": "HDFC Bank",
-            "bank_id_ref": 2
-        }
-    ]
+    """Mock database fixture"""
+    mock_db = AsyncMock()
     
+    # Mock fetch_all for banks
     async def mock_fetch_all(query, params=None):
-        if "banks" in query and "branches" not in query:
-            return mock_banks
-        elif "branches" in query:
-            return mock_branches
+        if "FROM banks" in query:
+            return MOCK_BANKS
+        elif "FROM branches" in query:
+            return MOCK_BRANCHES
         return []
     
+    # Mock fetch_one for specific queries
     async def mock_fetch_one(query, params=None):
-        if "COUNT" in query:
-            return {"total": len(mock_branches)}
-        elif "banks" in query:
-            return mock_banks[0]
-        elif "branches" in query:
-            return mock_branches[0]
+        if "FROM banks WHERE id" in query:
+            bank_id = params.get("id", 1)
+            return next((bank for bank in MOCK_BANKS if bank["id"] == bank_id), None)
+        elif "FROM branches b" in query and "WHERE b.ifsc" in query:
+            ifsc = params.get("ifsc", "")
+            return next((branch for branch in MOCK_BRANCHES if branch["ifsc"] == ifsc), None)
+        elif "COUNT(*)" in query:
+            return {"total": len(MOCK_BRANCHES)}
         return None
     
-    async def mock_connect():
-        pass
-    
-    async def mock_disconnect():
-        pass
+    mock_db.fetch_all = mock_fetch_all
+    mock_db.fetch_one = mock_fetch_one
+    mock_db.connect = AsyncMock()
+    mock_db.disconnect = AsyncMock()
+    mock_db.execute = AsyncMock()
+    mock_db.transaction = MagicMock()
     
-    with patch('main.database') as mock_db:
-        mock_db.fetch_all = mock_fetch_all
-        mock_db.fetch_one = mock_fetch_one
-        mock_db.connect = mock_connect
-        mock_db.disconnect = mock_disconnect
+    # Patch the global database variable
+    with patch('main.database', mock_db):
         yield mock_db
+
+@pytest_asyncio.fixture
+async def client(mock_database):
+    """Create an async test client with mocked database"""
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
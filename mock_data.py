@@ -0,0 +1,32 @@
+"""Sample rows shared by the test suite's mocked database."""
+
+MOCK_BANKS = [
+    {"id": 1, "name": "State Bank of India"},
+    {"id": 2, "name": "HDFC Bank"},
+    {"id": 3, "name": "ICICI Bank"}
+]
+
+MOCK_BRANCHES = [
+    {
+        "ifsc": "SBIN0000001",
+        "bank_id": 1,
+        "branch": "Mumbai Main Branch",
+        "address": "123 Fort Area, Mumbai",
+        "city": "Mumbai",
+        "district": "Mumbai",
+        "state": "Maharashtra",
+        "bank_name": "State Bank of India",
+        "bank_id_ref": 1
+    },
+    {
+        "ifsc": "HDFC0000001",
+        "bank_id": 2,
+        "branch": "Delhi Branch",
+        "address": "456 CP, New Delhi",
+        "city": "Delhi",
+        "district": "Central Delhi",
+        "state": "Delhi",
+        "bank_name": "HDFC Bank",
+        "bank_id_ref": 2
+    }
+]
@@ -0,0 +1,182 @@
+"""Replay captured /gql traffic against the API for capacity planning.
+
+Requests are sent open-loop: arrivals follow a fixed schedule at ``--rate``
+requests per second whether or not earlier requests have finished, and each
+latency is measured from the request's scheduled send time. A slow server
+therefore shows up as higher latency instead of silently lowering the offered
+load (no coordinated omission).
+
+Capture traffic by running the API with ``CAPTURE_FILE=traffic.jsonl``, or
+start from ``sample_traffic.jsonl``, which matches the rows inserted by
+``database_setup.py``:
+
+    python replay.py sample_traffic.jsonl --url http://localhost:8000 --rate 50 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+PERCENTILES = [50, 95, 99, 99.9]
+
+
+class OperationStats:
+    """Latencies (seconds) and error count for one operation."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+
+def load_records(path: str) -> List[dict]:
+    """Read captured requests, one JSON object with a ``query`` per line."""
+    records = []
+    with open(path) as capture:
+        for line in capture:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    if not records:
+        raise ValueError(f"No requests found in {path}")
+    return records
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(round(pct * len(sorted_values) / 100, 9)))
+    return sorted_values[rank - 1]
+
+
+def arrival_offsets(count: int, rate: float, poisson: bool, seed: Optional[int] = None) -> List[float]:
+    """Scheduled send times, in seconds from the start of the run."""
+    if not poisson:
+        return [i / rate for i in range(count)]
+    rng = random.Random(seed)
+    offsets, t = [], 0.0
+    for _ in range(count):
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    records: List[dict],
+    rate: float,
+    duration: float,
+    concurrency: int,
+    poisson: bool = False,
+    seed: Optional[int] = None,
+) -> Dict[str, OperationStats]:
+    """Send ``rate * duration`` requests, cycling through ``records``."""
+    stats: Dict[str, OperationStats] = {}
+    in_flight = asyncio.Semaphore(concurrency)
+
+    async def send(record: dict, scheduled: float):
+        operation = record.get("operation") or record.get("operationName") or "anonymous"
+        op_stats = stats.setdefault(operation, OperationStats())
+        payload = {key: record[key] for key in ("query", "variables", "operationName") if record.get(key)}
+        failed = False
+        async with in_flight:
+            try:
+                response = await client.post("/gql", json=payload)
+                failed = response.status_code != 200 or "errors" in response.json()
+            except (httpx.HTTPError, ValueError):
+                failed = True
+        op_stats.latencies.append(time.perf_counter() - scheduled)
+        op_stats.errors += failed
+
+    total = max(1, int(rate * duration))
+    start = time.perf_counter()
+    tasks = []
+    for i, offset in enumerate(arrival_offsets(total, rate, poisson, seed)):
+        scheduled = start + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(records[i % len(records)], scheduled)))
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def build_report(stats: Dict[str, OperationStats], elapsed: float) -> Dict[str, dict]:
+    """Throughput, error rate and latency percentiles (ms) per operation and overall."""
+    everything = OperationStats()
+    for op_stats in stats.values():
+        everything.latencies.extend(op_stats.latencies)
+        everything.errors += op_stats.errors
+
+    report = {}
+    for operation, op_stats in sorted(stats.items()) + [("ALL", everything)]:
+        latencies = sorted(op_stats.latencies)
+        row = {
+            "count": op_stats.count,
+            "throughput": op_stats.count / elapsed if elapsed else 0.0,
+            "error_rate": op_stats.errors / op_stats.count if op_stats.count else 0.0,
+        }
+        for pct in PERCENTILES:
+            row[f"p{str(pct).replace('.', '')}"] = percentile(latencies, pct) * 1000
+        report[operation] = row
+    return report
+
+
+def format_report(report: Dict[str, dict]) -> str:
+    columns = ["count", "throughput", "error_rate"] + [f"p{str(p).replace('.', '')}" for p in PERCENTILES]
+    width = max(len(name) for name in report) + 2
+    lines = ["operation".ljust(width) + "".join(c.rjust(12) for c in columns)]
+    for operation, row in report.items():
+        cells = [
+            str(row["count"]),
+            f"{row['throughput']:.1f}/s",
+            f"{row['error_rate'] * 100:.2f}%",
+        ] + [f"{row[c]:.1f}ms" for c in columns[3:]]
+        lines.append(operation.ljust(width) + "".join(cell.rjust(12) for cell in cells))
+    return "\n".join(lines)
+
+
+async def run(args):
+    records = load_records(args.capture)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        stats = await replay(
+            client, records, args.rate, args.duration, args.concurrency,
+            poisson=args.poisson, seed=args.seed
+        )
+        elapsed = time.perf_counter() - start
+
+    report = build_report(stats, elapsed)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured /gql traffic and report latency")
+    parser.add_argument("capture", help="JSONL file of captured requests")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the API")
+    parser.add_argument("--rate", type=float, default=20.0, help="Arrival rate in requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Length of the run in seconds")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--poisson", action="store_true", help="Use Poisson arrivals instead of a fixed interval")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for Poisson arrivals")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,19 @@
 import pytest
-import pytest_asyncio
 import asyncio
-from httpx import AsyncClient
-from unittest.mock import AsyncMock, patch
-from main import app
+from unittest.mock import AsyncMock, MagicMock, patch
+from mock_data import MOCK_BANKS
+import main
+from main import app, lifespan, AdmissionLimiter, LIMITERS, Overloaded, pool_options, ReplicaNode, pick_replica, warm_up, WARMUP_QUERIES, PRELOAD_QUERY
 import json
+import os
+import asyncpg
+import subprocess
+import sys
 
-# Mock database responses
-MOCK_BANKS = [
-    {"id": 1, "name": "State Bank of India"},
-    {"id": 2, "name": "HDFC Bank"},
-    {"id": 3, "name": "ICICI Bank"}
-]
-
-MOCK_BRANCHES = [
-    {
-        "ifsc": "SBIN0000001",
-        "bank_id": 1,
-        "branch": "Mumbai Main Branch",
-        "address": "123 Fort Area, Mumbai",
-        "city": "Mumbai",
-        "district": "Mumbai",
-        "state": "Maharashtra",
-        "bank_name": "State Bank of India",
-        "bank_id_ref": 1
-    },
-    {
-        "ifsc": "HDFC0000001",
-        "bank_id": 2,
-        "branch": "Delhi Branch",
-        "address": "456 CP, New Delhi",
-        "city": "Delhi",
-        "district": "Central Delhi",
-        "state": "Delhi",
-        "bank_name": "HDFC Bank",
-        "bank_id_ref": 2
-    }
-]
-
-@pytest_asyncio.fixture(scope="function")
-async def mock_database():
-    """Mock database fixture"""
-    mock_db = AsyncMock()
-    
-    # Mock fetch_all for banks
-    async def mock_fetch_all(query, params=None):
-        if "FROM banks" in query:
-            return MOCK_BANKS
-        elif "FROM branches" in query:
-            return MOCK_BRANCHES
-        return []
-    
-    # Mock fetch_one for specific queries
-    async def mock_fetch_one(query, params=None):
-        if "FROM banks WHERE id" in query:
-            bank_id = params.get("id", 1)
-            return next((bank for bank in MOCK_BANKS if bank["id"] == bank_id), None)
-        elif "FROM branches b" in query and "WHERE b.ifsc" in query:
-            ifsc = params.get("ifsc", "")
-            return next((branch for branch in MOCK_BRANCHES if branch["ifsc"] == ifsc), None)
-        elif "COUNT(*)" in query:
-            return {"total": len(MOCK_BRANCHES)}
-        return None
-    
-    mock_db.fetch_all = mock_fetch_all
-    mock_db.fetch_one = mock_fetch_one
-    mock_db.connect = AsyncMock()
-    mock_db.disconnect = AsyncMock()
-    
-    # Patch the global database variable
-    with patch('main.database', mock_db):
-        yield mock_db
-
-@pytest_asyncio.fixture
-async def client(mock_database):
-    """Create an async test client with mocked database"""
-    async with AsyncClient(app=app, base_url="http://test") as ac:
-        yield ac
+# Import-time budget for the serving path, in seconds
+IMPORT_BUDGET = float(os.getenv("IMPORT_BUDGET", "3.0"))
+# Modules that must never be imported by the serving path
+HEAVY_MODULES = ["pandas", "numpy"]
 
 @pytest.mark.asyncio
 async def test_health_check(client):
@@ -266,4 +203,231 @@ async def test_graphql_nonexistent_branch(client):
     assert response.status_code == 200
     data = response.json()
     assert "data" in data
-    assert data["data"]["branchByIfsc"] is None
\ No newline at end of file
+    assert data["data"]["branchByIfsc"] is None
+
+@pytest.mark.asyncio
+async def test_graphql_overloaded_returns_503(client):
+    """Test that a full scan queue is rejected with 503 and Retry-After"""
+    saturated = AdmissionLimiter(
+        "scan", max_concurrency=1, max_queue=0, queue_timeout=0.1,
+        statement_timeout_ms=5000, retry_after=3
+    )
+    async with saturated.slot():
+        with patch.dict(LIMITERS, {"scan": saturated}):
+            response = await client.post(
+                "/gql", json={"query": "query { branches { totalCount } }"}
+            )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+    assert "errors" in response.json()
+
+@pytest.mark.asyncio
+async def test_graphql_scan_overload_does_not_block_lookups(client):
+    """Test that saturated branch scans leave IFSC lookups and /health alone"""
+    saturated = AdmissionLimiter(
+        "scan", max_concurrency=1, max_queue=0, queue_timeout=0.1,
+        statement_timeout_ms=5000, retry_after=1
+    )
+    async with saturated.slot():
+        with patch.dict(LIMITERS, {"scan": saturated}):
+            response = await client.post(
+                "/gql", json={"query": 'query { branchByIfsc(ifsc: "SBIN0000001") { ifsc } }'}
+            )
+            health = await client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["data"]["branchByIfsc"]["ifsc"] == "SBIN0000001"
+    assert health.status_code == 200
+
+@pytest.mark.asyncio
+async def test_graphql_sets_statement_timeout(client, mock_database):
+    """Test that each query class runs under its own statement_timeout"""
+    await client.post("/gql", json={"query": "query { branches { totalCount } }"})
+    mock_database.execute.assert_awaited_with(
+        f"SET LOCAL statement_timeout = {LIMITERS['scan'].statement_timeout_ms}"
+    )
+
+@pytest.mark.asyncio
+async def test_graphql_lookup_skips_transaction(client, mock_database):
+    """Test that lookups rely on the pool's statement_timeout, with no extra round trips"""
+    await client.post("/gql", json={"query": 'query { branchByIfsc(ifsc: "SBIN0000001") { ifsc } }'})
+    mock_database.transaction.assert_not_called()
+    mock_database.execute.assert_not_awaited()
+    assert pool_options()["server_settings"] == {
+        "statement_timeout": str(LIMITERS["lookup"].statement_timeout_ms)
+    }
+
+@pytest.mark.asyncio
+async def test_admission_limiter_queue_timeout():
+    """Test that a waiter gives up after queue_timeout instead of waiting forever"""
+    limiter = AdmissionLimiter(
+        "scan", max_concurrency=1, max_queue=5, queue_timeout=0.05,
+        statement_timeout_ms=0, retry_after=1
+    )
+    async with limiter.slot():
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+    assert limiter.waiting == 0
+
+def make_replica(healthy=True, outstanding=0):
+    """Build a replica node backed by a mock database"""
+    node = ReplicaNode("postgresql://replica/bank")
+    node.database = MagicMock()
+    node.database.fetch_all = AsyncMock(return_value=MOCK_BANKS[:1])
+    node.database.execute = AsyncMock()
+    node.healthy = healthy
+    node.outstanding = outstanding
+    return node
+
+def test_pick_replica_least_outstanding():
+    """Test that reads go to the healthy replica with the fewest requests in flight"""
+    busy, idle, down = make_replica(outstanding=3), make_replica(outstanding=1), make_replica(healthy=False)
+    with patch("main.replicas", [busy, idle, down]):
+        assert pick_replica() is idle
+    with patch("main.replicas", [down]):
+        assert pick_replica() is None
+
+@pytest.mark.asyncio
+async def test_graphql_reads_routed_to_replica(client, mock_database):
+    """Test that resolvers read from a healthy replica instead of the primary"""
+    node = make_replica()
+    with patch("main.replicas", [node]):
+        response = await client.post("/gql", json={"query": "query { banks { name } }"})
+    assert response.json()["data"]["banks"] == [{"name": MOCK_BANKS[0]["name"]}]
+    node.database.fetch_all.assert_awaited_once()
+    assert node.outstanding == 0
+
+@pytest.mark.asyncio
+async def test_graphql_replica_failover_to_primary(client, mock_database):
+    """Test that an unreachable replica is marked down and the read uses the primary"""
+    node = make_replica()
+    node.database.connection.return_value.__aenter__.side_effect = ConnectionRefusedError()
+    with patch("main.replicas", [node]):
+        response = await client.post("/gql", json={"query": "query { banks { name } }"})
+    assert len(response.json()["data"]["banks"]) == len(MOCK_BANKS)
+    assert node.healthy is False
+    node.database.fetch_all.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_replica_rewarmed_after_failing_a_read(client, mock_database):
+    """Test that a replica marked down by a failed read is re-warmed before it rejoins"""
+    node = make_replica()
+    node.warmed = True
+    node.database.connection.return_value.__aenter__.side_effect = ConnectionRefusedError()
+    with patch("main.replicas", [node]):
+        await client.post("/gql", json={"query": "query { banks { name } }"})
+    assert node.healthy is False
+    assert node.warmed is False
+    node.database.is_connected = True
+    node.database.fetch_val = AsyncMock(return_value=1)
+    with patch("main.warm_pool", AsyncMock()) as warm_pool:
+        assert await node.check() is True
+    warm_pool.assert_awaited_once_with(node.database)
+    assert node.warmed is True
+
+@pytest.mark.asyncio
+async def test_replica_check_survives_unexpected_errors():
+    """Test that any health check error marks the replica down instead of raising"""
+    node = make_replica()
+    node.database.is_connected = True
+    node.database.fetch_val = AsyncMock(side_effect=asyncpg.InterfaceError("connection is closed"))
+    assert await node.check() is False
+    assert node.healthy is False
+    node.database.fetch_val = AsyncMock(return_value=1)
+    assert await node.check() is True
+
+@pytest.mark.asyncio
+async def test_lifespan_keeps_per_node_limits(mock_database):
+    """Test that replicas get their own limiters and restarts never compound limits"""
+    base = {name: limiter.max_concurrency for name, limiter in LIMITERS.items()}
+    urls = ["postgresql://replica-1/bank", "postgresql://replica-2/bank"]
+    with patch("main.Database", return_value=mock_database), \
+            patch("main.DATABASE_REPLICA_URLS", urls), patch("main.replicas", []) as nodes:
+        for _ in range(3):
+            async with lifespan(app):
+                assert len(nodes) == 2
+                for node in nodes:
+                    assert node.limiters["lookup"] is not LIMITERS["lookup"]
+                    assert node.limiters["lookup"].max_concurrency == base["lookup"]
+    assert {name: limiter.max_concurrency for name, limiter in LIMITERS.items()} == base
+
+@pytest.mark.asyncio
+async def test_ready_fails_until_warm(client):
+    """Test that /ready reports 503 until warm-up has finished"""
+    with patch("main.ready", False):
+        response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+    with patch("main.ready", True):
+        response = await client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+@pytest.mark.asyncio
+async def test_warm_up_runs_hot_queries_then_marks_ready(mock_database):
+    """Test that warm-up prepares the hot queries on every pooled connection of every node"""
+    connections = []
+
+    def new_connection():
+        connection = MagicMock()
+        connection.fetch_all = AsyncMock(return_value=[])
+        connections.append(connection)
+        context = MagicMock()
+        context.__aenter__.return_value = connection
+        return context
+
+    mock_database.connection = MagicMock(side_effect=new_connection)
+    mock_database.fetch_val = AsyncMock(return_value=0)
+    replica = make_replica(healthy=False)
+    replica.database = mock_database
+    with patch("main.ready", False), patch("main.DATABASE_POOL_MIN_SIZE", 2), \
+            patch("main.WARMUP_PRELOAD_BRANCHES", True), patch("main.replicas", [replica]):
+        await warm_up()
+        assert main.ready is True
+    # Primary and replica: two connections each, every hot query on each
+    assert len(connections) == 4
+    for connection in connections:
+        assert connection.fetch_all.await_count == len(WARMUP_QUERIES)
+    assert replica.healthy and replica.warmed
+    # One branches preload per node, plus the replica's SELECT 1
+    preloads = [c for c in mock_database.fetch_val.await_args_list if c.args[0] == PRELOAD_QUERY]
+    assert len(preloads) == 2
+    # Each preload runs in a transaction under the scan timeout, not the pool's lookup timeout
+    assert mock_database.transaction.call_count == 2
+    mock_database.execute.assert_awaited_with(
+        f"SET LOCAL statement_timeout = {LIMITERS['scan'].statement_timeout_ms}"
+    )
+    assert mock_database.execute.await_count == 2
+
+@pytest.mark.asyncio
+async def test_replica_check_times_out_stuck_warm_up():
+    """Test that a replica whose warm-up hangs fails its check instead of blocking it"""
+    node = make_replica(healthy=False)
+    node.database.is_connected = True
+    node.database.fetch_val = AsyncMock(return_value=1)
+
+    async def stuck(db):
+        await asyncio.Event().wait()
+
+    with patch("main.warm_pool", stuck), patch("main.WARMUP_TIMEOUT", 0.05):
+        assert await node.check() is False
+    assert node.healthy is False
+    assert node.warmed is False
+
+def test_import_budget():
+    """Test that importing the app is fast and keeps heavy modules out"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "print(json.dumps({'elapsed': time.perf_counter() - start, "
+        f"'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["heavy"] == []
+    assert report["elapsed"] < IMPORT_BUDGET
@@ -0,0 +1,105 @@
+import pytest
+import asyncio
+import strawberry
+from unittest.mock import AsyncMock, patch
+import main
+from main import app, lifespan, Query, TrafficCapture, TrafficRecorder
+from replay import (
+    OperationStats, arrival_offsets, build_report, load_records, percentile, replay
+)
+
+BANKS_RECORD = {"operation": "banks", "query": "query { banks { id name } }"}
+INVALID_RECORD = {"operation": "invalid", "query": "query { invalidField { id } }"}
+
+def test_percentile_nearest_rank():
+    """Test nearest-rank percentiles"""
+    values = [float(v) for v in range(1, 1001)]
+    assert percentile(values, 50) == 500.0
+    assert percentile(values, 99) == 990.0
+    assert percentile(values, 99.9) == 999.0
+    assert percentile([], 99) == 0.0
+
+def test_arrival_offsets_are_open_loop():
+    """Test that arrivals follow the configured rate regardless of responses"""
+    assert arrival_offsets(4, rate=2.0, poisson=False) == [0.0, 0.5, 1.0, 1.5]
+    poisson = arrival_offsets(1000, rate=100.0, poisson=True, seed=1)
+    assert poisson == sorted(poisson)
+    assert 8.0 < poisson[-1] < 12.0
+
+def test_build_report_per_operation():
+    """Test throughput, error rate and percentiles per operation and overall"""
+    lookups, scans = OperationStats(), OperationStats()
+    lookups.latencies = [0.001] * 9 + [0.1]
+    scans.latencies = [0.05] * 10
+    scans.errors = 5
+    report = build_report({"branchByIfsc": lookups, "branches": scans}, elapsed=2.0)
+    assert report["branchByIfsc"]["throughput"] == 5.0
+    assert report["branchByIfsc"]["p50"] == pytest.approx(1.0)
+    assert report["branchByIfsc"]["p999"] == pytest.approx(100.0)
+    assert report["branches"]["error_rate"] == 0.5
+    assert report["ALL"]["count"] == 20
+    assert report["ALL"]["error_rate"] == 0.25
+
+def test_load_sample_traffic():
+    """Test that the bundled sample traffic file loads"""
+    records = load_records("sample_traffic.jsonl")
+    assert all("query" in record for record in records)
+    assert {"branchByIfsc", "branches"} <= {record["operation"] for record in records}
+
+@pytest.mark.asyncio
+async def test_replay_counts_requests_and_errors(client):
+    """Test replaying against the app records every request per operation"""
+    stats = await replay(client, [BANKS_RECORD, INVALID_RECORD], rate=200.0, duration=0.1, concurrency=4)
+    assert stats["banks"].count == 10
+    assert stats["banks"].errors == 0
+    assert stats["invalid"].count == 10
+    assert stats["invalid"].errors == 10
+
+@pytest.mark.asyncio
+async def test_traffic_capture_writes_jsonl(mock_database, tmp_path):
+    """Test that captured operations can be loaded back for replay"""
+    capture_file = tmp_path / "traffic.jsonl"
+    schema = strawberry.Schema(query=Query, extensions=[TrafficCapture])
+    with patch("main.recorder", TrafficRecorder(str(capture_file))):
+        await schema.execute(
+            "query ($id: Int!) { bank(id: $id) { name } }",
+            variable_values={"id": 1},
+            context_value={"response": None},
+        )
+        # Nothing touches the file until the recorder flushes
+        assert not capture_file.exists()
+        await main.recorder.close()
+    records = load_records(str(capture_file))
+    assert len(records) == 1
+    assert records[0]["operation"] == "bank"
+    assert records[0]["variables"] == {"id": 1}
+    assert records[0]["query"].startswith("query ($id: Int!)")
+
+@pytest.mark.asyncio
+async def test_traffic_recorder_survives_write_errors(tmp_path):
+    """Test that a failed write drops its batch but capture keeps running"""
+    recorder = TrafficRecorder(str(tmp_path / "missing-dir" / "traffic.jsonl"))
+    with patch("main.CAPTURE_FLUSH_INTERVAL", 0.01):
+        task = asyncio.create_task(recorder.run())
+        recorder.record("lost\n")
+        await asyncio.sleep(0.05)
+        assert not task.done()
+        assert recorder.pending == []
+        recorder.path = str(tmp_path / "traffic.jsonl")
+        recorder.record("kept\n")
+        await asyncio.sleep(0.05)
+        task.cancel()
+    await recorder.close()
+    assert (tmp_path / "traffic.jsonl").read_text() == "kept\n"
+
+@pytest.mark.asyncio
+async def test_shutdown_disconnects_even_if_capture_close_fails(mock_database, tmp_path):
+    """Test that a failing capture flush at shutdown still disconnects the pools"""
+    recorder = TrafficRecorder(str(tmp_path / "traffic.jsonl"))
+    recorder.close = AsyncMock(side_effect=OSError("disk full"))
+    with patch("main.Database", return_value=mock_database), patch("main.recorder", recorder):
+        with pytest.raises(OSError):
+            async with lifespan(app):
+                pass
+    recorder.close.assert_awaited_once()
+    mock_database.disconnect.assert_awaited_once()